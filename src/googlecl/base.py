@@ -188,7 +188,9 @@ class BaseCL(object):
     Keyword arguments:
       uri: URI to get the feed from.
       titles: string or list What to look for in entry.title.text.
-              Default None for all entries from feed.
+              Default None for all entries from feed. May also be a compiled
+              regular expression, which is matched against titles whether
+              or not the regex option is set.
       converter: Converter to use on the feed. If specified, will be passed
                  into the GetFeed method. If both converter and
                  desired_class are None, GetFeed is called without those
@@ -202,6 +204,23 @@ class BaseCL(object):
     Returns:
       List of entries.
     """
+    return list(self.iter_entries(uri, titles, converter, desired_class))
+
+  GetEntries = get_entries
+
+  def iter_entries(self, uri, titles=None, converter=None, desired_class=None):
+    """Iterate over the entries from a feed uri.
+
+    Same as get_entries, but entries are yielded as soon as the page of the
+    feed holding them has been retrieved, instead of after the whole feed has
+    been downloaded.
+
+    Keyword arguments:
+      See get_entries.
+
+    Yields:
+      Entries matching titles.
+    """
     # XXX: Should probably go through all code and make sure title can only be
     # NoneType or list, not also maybe a string.
     if self.max_results is not None:
@@ -232,25 +251,17 @@ class BaseCL(object):
         print "python-gdata may not support this action. Please see this wiki page "
         print "for more details:"
         print "http://code.google.com/p/googlecl/wiki/UploadingGoogleDocs\n\n"
-      return []
-    all_entries = feed.entry
-    if feed.GetNextLink():
-      if self.cap_results:
-        LOG.warning('Leaving data that matches query on server.' +
-                    ' Increase max_results or set cap_results to False.')
-      else:
-        while feed and feed.GetNextLink():
-          feed = self.GetNext(feed)
-          if feed:
-            all_entries.extend(feed.entry)
+      return
+
     # Check if title is NoneType, empty string, empty list, or a single-item
     # list containing any of the prior.
-    if not titles or (len(titles) == 1 and not titles[0]):
-      LOG.debug('Retrieved ' + str(len(all_entries)) +
-                ' entries, returning them all')
-      return all_entries
-
-    if self.use_regex:
+    if hasattr(titles, 'match'):
+      title_pattern = titles
+      title_matches = lambda entry: (entry.title.text and
+                          title_pattern.match(safe_decode(entry.title.text)))
+    elif not titles or (len(titles) == 1 and not titles[0]):
+      title_matches = None
+    elif self.use_regex:
       # Carefully build title regex.
       if isinstance(titles, basestring):
         title_regex = titles
@@ -258,24 +269,38 @@ class BaseCL(object):
         title_regex = safe_decode('|'.join(titles))
       LOG.debug(safe_encode('Using regex: ' + title_regex))
       try:
-        entries = [entry for entry in all_entries
-                   if entry.title.text and
-                   re.match(title_regex, safe_decode(entry.title.text))]
+        title_pattern = re.compile(title_regex)
       except re.error, err:
         LOG.error('Regular expression error: ' + str(err) + '!')
-        entries = []
+        return
+      title_matches = lambda entry: (entry.title.text and
+                          title_pattern.match(safe_decode(entry.title.text)))
     else:
       if isinstance(titles, list):
         title_list = titles
       else:
         title_list = [titles]
-      entries = [entry for entry in all_entries
-                 if safe_decode(entry.title.text) in title_list]
-    LOG.debug('Retrieved ' + str(len(all_entries)) +
-              ' entries, returning ' + str(len(entries)) + ' of them')
-    return entries
-
-  GetEntries = get_entries
+      title_matches = lambda entry: (safe_decode(entry.title.text) in
+                                     title_list)
+
+    num_retrieved = 0
+    num_returned = 0
+    if feed.GetNextLink() and self.cap_results:
+      LOG.warning('Leaving data that matches query on server.' +
+                  ' Increase max_results or set cap_results to False.')
+    while feed:
+      for entry in feed.entry:
+        num_retrieved += 1
+        if title_matches is None or title_matches(entry):
+          num_returned += 1
+          yield entry
+      if self.cap_results or not feed.GetNextLink():
+        break
+      feed = self.GetNext(feed)
+    LOG.debug('Retrieved ' + str(num_retrieved) +
+              ' entries, returning ' + str(num_returned) + ' of them')
+
+  IterEntries = iter_entries
 
   def get_single_entry(self, uri_or_entry_list, title=None, converter=None,
                        desired_class=None):
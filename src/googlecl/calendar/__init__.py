@@ -18,13 +18,19 @@ import googlecl.base
 import logging
 import re
 import time
-from googlecl.calendar.date import DateRangeParser
+from googlecl.calendar.date import Date, DateRange, DateRangeParser
+from googlecl.calendar.date import datetime_today
 
 service_name = __name__.split('.')[-1]
 LOGGER_NAME = __name__
 SECTION_HEADER = service_name.upper()
 
 LOG = logging.getLogger(LOGGER_NAME)
+# Page size for listing a single day of events. One page almost always holds
+# the whole day, so there's no point asking for more.
+ONE_DAY_MAX_RESULTS = 50
+# Shared so that repeated commands in interactive mode can reuse parsed dates.
+DATE_RANGE_PARSER = DateRangeParser()
 # Rename to reduce verbosity
 safe_encode = googlecl.safe_encode
 
@@ -72,23 +78,34 @@ def convert_reminder_string(reminder):
     return int(reminder)
 
 
-def filter_recurring_events(events, recurrences_expanded):
-  if recurrences_expanded:
-    is_recurring = lambda event: event.original_event
-  else:
-    is_recurring = lambda event: event.recurrence
-  return [e for e in events if not is_recurring(e)]
+def partition_recurring_events(events, recurrences_expanded):
+  """Split events into one-time and recurring events in a single pass.
 
+  Keyword arguments:
+    events: List of events to split.
+    recurrences_expanded: True if recurring events were expanded into their
+                          instances (the 'singleevents' query parameter).
 
-def filter_single_events(events, recurrences_expanded):
+  Returns:
+    Tuple of (single_events, recurring_events), each keeping the order of
+    events.
+  """
   if recurrences_expanded:
-    is_single = lambda event: not event.original_event
+    is_recurring = lambda event: event.original_event
   else:
-    is_single = lambda event: not event.recurrence
-  return [e for e in events if not is_single(e)]
+    is_recurring = lambda event: event.recurrence
+  single_events = []
+  recurring_events = []
+  for event in events:
+    if is_recurring(event):
+      recurring_events.append(event)
+    else:
+      single_events.append(event)
+  return single_events, recurring_events
 
 
-def filter_all_day_events_outside_range(start_date, end_date, events):
+def ifilter_all_day_events_outside_range(start_date, end_date, events):
+  """Yield events, leaving out all-day events outside the given range."""
   if start_date:
     if start_date.all_day:
       start_datetime = start_date.local
@@ -103,7 +120,6 @@ def filter_all_day_events_outside_range(start_date, end_date, events):
       end_datetime = datetime.datetime(year=end_date.local.year,
                                        month=end_date.local.month,
                                        day=end_date.local.day)
-  new_events = []
   for event in events:
     try:
       start = datetime.datetime.strptime(event.when[0].start_time, '%Y-%m-%d')
@@ -113,11 +129,11 @@ def filter_all_day_events_outside_range(start_date, end_date, events):
         raise err
       else:
         #Errors that complain of unconverted data are events with duration
-        new_events.append(event)
+        yield event
     else:
       if ((not start_date or start >= start_datetime) and
           (not end_date or end <= inclusive_end_datetime)):
-        new_events.append(event)
+        yield event
       elif event.recurrence:
         # While writing the below comment, I was 90% sure it was true. Testing
         # this case, however, showed that things worked out just fine -- the
@@ -130,9 +146,7 @@ def filter_all_day_events_outside_range(start_date, end_date, events):
         # we will incorrectly return this event.
         # This is unavoidable unless we a) perform another query or b)
         # incorporate a recurrence parser.
-        new_events.append(event)
-
-  return new_events
+        yield event
 
 
 def filter_canceled_events(events, recurrences_expanded):
@@ -267,25 +281,25 @@ class CalendarEntryToStringWrapper(googlecl.base.BaseEntryToStringWrapper):
     return self._join(self.entry.where, text_attribute='value_string')
 
 
-def _list(client, options, args):
+def _list(client, options, args, date_range=None, max_results=None):
   cal_user_list = client.get_calendar_user_list(options.cal)
   if not cal_user_list:
     LOG.error('No calendar matches "' + options.cal + '"')
     return
   titles_list = googlecl.build_titles_list(options.title, args)
-  parser = DateRangeParser()
-  date_range = parser.parse(options.date)
+  if date_range is None:
+    date_range = DATE_RANGE_PARSER.parse(options.date)
   for cal in cal_user_list:
     print ''
     print safe_encode('[' + unicode(cal) + ']')
-    single_events = client.get_events(cal.user,
-                                      start_date=date_range.start,
-                                      end_date=date_range.end,
-                                      titles=titles_list,
-                                      query=options.query,
-                                      split=False)
-
-    for entry in single_events:
+    events = client.iter_events(cal.user,
+                                start_date=date_range.start,
+                                end_date=date_range.end,
+                                titles=titles_list,
+                                query=options.query,
+                                max_results=max_results)
+
+    for entry in events:
       print googlecl.base.compile_entry_string(
                             CalendarEntryToStringWrapper(entry, client.config),
                             options.fields.split(','),
@@ -310,8 +324,10 @@ def _run_list(client, options, args):
 
 
 def _run_list_today(client, options, args):
-  options.date = 'today'
-  _list(client, options, args)
+  # Same range DateRangeParser gives for 'today', without the parsing.
+  today = Date(local_datetime=datetime_today(), all_day=True)
+  _list(client, options, args, date_range=DateRange(today, today, False),
+        max_results=ONE_DAY_MAX_RESULTS)
 
 
 def _run_add(client, options, args):
@@ -347,8 +363,7 @@ def _run_delete(client, options, args):
   if not cal_user_list:
     LOG.error('No calendar matches "' + options.cal + '"')
     return
-  parser = DateRangeParser()
-  date_range = parser.parse(options.date)
+  date_range = DATE_RANGE_PARSER.parse(options.date)
 
   titles_list = googlecl.build_titles_list(options.title, args)
   for cal in cal_user_list:
@@ -361,7 +376,10 @@ def _run_delete(client, options, args):
     if options.prompt:
       LOG.info(safe_encode('For calendar ' + unicode(cal)))
     if single_events:
-      client.DeleteEntryList(single_events, 'event', options.prompt)
+      if options.prompt:
+        client.DeleteEntryList(single_events, 'event', options.prompt)
+      else:
+        client.delete_events(single_events, cal.user)
     if recurring_events:
       if date_range.specified_as_range:
         # if the user specified a date that was a range...
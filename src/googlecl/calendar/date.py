@@ -46,6 +46,8 @@ AMBIGUOUS_TIME_REGEX = '((?:1[0-2])|(?:[1-9]))?(?::([0-9]{2}))?$'
 
 _DAY_TIME_TOKENIZERS = ['@', ' at ']
 _RANGE_TOKENIZERS = [',']
+# Number of parsed ranges a DateRangeParser holds on to.
+_MAX_CACHED_RANGES = 64
 
 
 class Error(Exception):
@@ -498,10 +500,15 @@ class DateRangeParser(object):
     if range_tokenizers is None:
       range_tokenizers = _RANGE_TOKENIZERS
     self.range_tokenizers = range_tokenizers
+    self._cache = {}
 
   def parse(self, date_string, shift_dates=False):
     """"Parses a string into a start and end date.
 
+    Results are cached for the rest of the minute they were parsed in. Text
+    like "today" or "+2" depends on the current time, but Calendar only
+    cares about times down to the minute.
+
     Note: This is Google Calendar specific. If date_string does not contain a
     range tokenizer, it will be treated as the starting date of a one day range.
 
@@ -517,6 +524,20 @@ class DateRangeParser(object):
       start until the distant future, or from the distant past until the end
       date.) If date_string is empty or None, this will be (None, None).
     """
+    minute = self.date_parser.now().replace(second=0, microsecond=0)
+    key = (date_string, shift_dates, minute)
+    try:
+      return self._cache[key]
+    except KeyError:
+      pass
+    if len(self._cache) >= _MAX_CACHED_RANGES:
+      self._cache.clear()
+    date_range = self._parse(date_string, shift_dates)
+    self._cache[key] = date_range
+    return date_range
+
+  def _parse(self, date_string, shift_dates):
+    """Does the work of parse(), without caching."""
     start_date = None
     end_date = None
     start_text, is_range, end_text = split_string(date_string,
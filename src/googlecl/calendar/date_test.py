@@ -228,6 +228,22 @@ class ParseDateRange(ParsingDatesTest):
                               date_range.end.local)
     self.assertTrue(date_range.specified_as_range)
 
+  def testCachedWithinMinute(self):
+    first = self.parser.parse(RANGE_BASE_TEXT)
+    self.assertTrue(self.parser.parse(RANGE_BASE_TEXT) is first)
+    self.assertFalse(self.parser.parse(RANGE_BASE_TEXT, shift_dates=True) is
+                     first)
+
+  def testNotCachedAcrossMinutes(self):
+    times = [NOW]
+    parser = date.DateRangeParser(static_today, lambda: times[0])
+    first = parser.parse('+1')
+    times[0] = NOW + timedelta(minutes=1)
+    second = parser.parse('+1')
+    self.assertEqual(first.start.local, NOW + timedelta(hours=1))
+    self.assertEqual(second.start.local,
+                     NOW + timedelta(hours=1, minutes=1))
+
 
 if __name__ == '__main__':
   unittest.main()
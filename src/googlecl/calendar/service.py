@@ -23,20 +23,39 @@ List events for today:
   calendar today
 
 """
+from __future__ import with_statement
+
 __author__ = 'tom.h.miller@gmail.com (Tom Miller)'
+import atom
+import copy
 import gdata.calendar.service
+import googlecl
 import googlecl.base
 import googlecl.service
+import httplib
 import logging
+import os
+import pickle
+import Queue
+import re
+import socket
+import threading
+import time
 import urllib
 from googlecl import safe_encode, safe_decode
 from googlecl.calendar import SECTION_HEADER
-from googlecl.calendar.date import DateRangeParser
 
 
 LOG = logging.getLogger(googlecl.calendar.LOGGER_NAME)
 USER_BATCH_URL_FORMAT = \
                gdata.calendar.service.DEFAULT_BATCH_URL.replace('default', '%s')
+CALENDAR_LIST_CACHE_FILENAME_FORMAT = 'calendar_list_%s'
+# Number of seconds a cached calendar lookup stays valid.
+CALENDAR_LIST_CACHE_TTL = 3600
+# Maximum number of operations sent in one batch request.
+BATCH_DELETE_SIZE = 50
+# Calendar names that always refer to the user's primary calendar.
+PRIMARY_CALENDAR_ALIASES = ('default', 'primary')
 
 
 class CalendarError(googlecl.base.Error):
@@ -83,24 +102,157 @@ class CalendarServiceCL(gdata.calendar.service.CalendarService,
     """Constructor."""
     gdata.calendar.service.CalendarService.__init__(self)
     googlecl.service.BaseServiceCL.__init__(self, SECTION_HEADER, config)
+    # Deleting or listing events can take several requests in a row, so keep
+    # the connection to the Calendar servers open between them.
+    self.http_client = googlecl.service.KeepAliveHttpClient()
+    # Maps calendar names (or regexes) to results of get_calendar_user_list.
+    self._calendar_user_lists = {}
+    # Maps calendar users to event queries holding the options every events
+    # query shares. See _get_event_query_template.
+    self._event_query_templates = {}
+    self.cache_calendar_list = self.config.lazy_get(SECTION_HEADER,
+                                                    'cache_calendar_list',
+                                                    default=True,
+                                                    option_type=bool)
+    # Number of DELETE requests to have in flight at once when events can't be
+    # deleted with a batch request.
+    self.delete_concurrency = self.config.lazy_get(SECTION_HEADER,
+                                                   'delete_concurrency',
+                                                   default=4,
+                                                   option_type=int)
+
+  def _batch_delete_recur(self, event, batch_url, instances_by_series):
+    """Delete a subset of instances of recurring events.
 
-  def _batch_delete_recur(self, event, cal_user,
-                          start_date=None, end_date=None):
-    """Delete a subset of instances of recurring events."""
-    request_feed = gdata.calendar.CalendarEventFeed()
-    # Don't need to decode event.title.text here because it's not being
-    # displayed to the user. Totally internal.
-    _, recurring_events = self.get_events(cal_user, start_date=start_date,
-                                          end_date=end_date,
-                                          titles=event.title.text,
-                                          expand_recurrence=True)
-
-    delete_events = [e for e in recurring_events if e.original_event and
-                     e.original_event.id == event.original_event.id]
+    Args:
+      event: Expanded instance of the recurring event to delete instances of.
+      batch_url: Batch URL of the calendar the event belongs to.
+      instances_by_series: Dictionary mapping series ids to the instances to
+          delete. See _get_instances_by_series.
+    """
+    delete_events = instances_by_series.get(event.original_event.id)
     if not delete_events:
       raise EventsNotFound
-    map(request_feed.AddDelete, [None], delete_events, [None])
-    self.ExecuteBatch(request_feed, USER_BATCH_URL_FORMAT % cal_user)
+    self._batch_delete(delete_events, batch_url)
+
+  def _get_instances_by_series(self, events, cal_user, start_date, end_date):
+    """Get the instances of several recurring events with one query.
+
+    Args:
+      events: List of expanded instances, one for each series to look up.
+      cal_user: "User" of the calendar the events belong to.
+      start_date: Date specifying the start of instances (inclusive).
+      end_date: Date specifying the end of instances (inclusive). None for no
+          end date.
+
+    Returns:
+      Dictionary mapping series ids to lists of their instances between
+      start_date and end_date.
+    """
+    if any(not event.title.text for event in events):
+      # There's no title to match untitled series by, so get every instance
+      # and rely on grouping them by series id below.
+      titles = None
+    else:
+      titles = list(set(safe_decode(event.title.text) for event in events))
+    if titles and self.use_regex:
+      # These are real titles, not patterns the user typed, so match them
+      # literally.
+      titles = re.compile(u'(?:%s)$' % u'|'.join(map(re.escape, titles)))
+    _, instances = self.get_events(cal_user, start_date=start_date,
+                                   end_date=end_date, titles=titles,
+                                   expand_recurrence=True)
+    instances_by_series = {}
+    for instance in instances:
+      instances_by_series.setdefault(instance.original_event.id,
+                                     []).append(instance)
+    return instances_by_series
+
+  def _batch_delete(self, events, batch_url):
+    """Delete events with as few batch requests as possible.
+
+    At most BATCH_DELETE_SIZE events go in each request. Falls back to
+    deleting the events of a request one at a time if the request itself
+    fails.
+
+    Args:
+      events: List of events to delete.
+      batch_url: Batch URL of the calendar the events belong to.
+    """
+    for start in range(0, len(events), BATCH_DELETE_SIZE):
+      chunk = events[start:start + BATCH_DELETE_SIZE]
+      request_feed = gdata.calendar.CalendarEventFeed()
+      for i, event in enumerate(chunk):
+        request_feed.AddDelete(entry=event,
+                               batch_id_string='delete-%d' % (start + i))
+      try:
+        response_feed = self.ExecuteBatch(request_feed, batch_url)
+      except self.request_error, err:
+        LOG.debug('Batch delete failed, deleting events one at a time: %s',
+                  err)
+        self._delete_individually(chunk)
+      else:
+        for entry in response_feed.entry:
+          if entry.batch_status and int(entry.batch_status.code) >= 300:
+            LOG.warning('Could not delete event: ' +
+                        entry.batch_status.reason)
+
+  def _delete_individually(self, events):
+    """Delete events with one request each.
+
+    Up to delete_concurrency requests are made at the same time.
+
+    Args:
+      events: List of events to delete.
+    """
+    event_queue = Queue.Queue()
+    for event in events:
+      event_queue.put(event)
+
+    def delete_queued_events(expected_errors):
+      while True:
+        try:
+          event = event_queue.get_nowait()
+        except Queue.Empty:
+          return
+        # Delete is BaseServiceCL.retry_delete, which keeps the operation to
+        # retry on self. Every thread stores the same one, so that's safe.
+        try:
+          self.Delete(event.GetEditLink().href)
+        except expected_errors, err:
+          LOG.warning('Could not delete event: %s' % err)
+
+    num_threads = min(self.delete_concurrency, len(events))
+    if num_threads <= 1:
+      delete_queued_events((self.request_error, httplib.HTTPException,
+                            socket.error))
+      return
+    # An exception would end a worker thread and leave its share of the queue
+    # behind without anyone noticing, so workers report every error and
+    # keep going.
+    threads = [threading.Thread(target=delete_queued_events,
+                                args=(Exception,))
+               for _ in range(num_threads)]
+    for thread in threads:
+      # Don't keep the process alive after Ctrl-C.
+      thread.setDaemon(True)
+      thread.start()
+    for thread in threads:
+      # A plain join() can't be interrupted with Ctrl-C.
+      while thread.isAlive():
+        thread.join(1)
+
+  def delete_events(self, events, calendar_user):
+    """Delete non-recurring events without prompting.
+
+    Keyword arguments:
+      events: List of events to delete.
+      calendar_user: "User" of the calendar the events belong to.
+
+    """
+    self._batch_delete(events, USER_BATCH_URL_FORMAT % calendar_user)
+
+  DeleteEvents = delete_events
 
   def add_reminders(self, calendar_user, events, minutes):
     """Add default reminders to events.
@@ -154,53 +306,69 @@ class CalendarServiceCL(gdata.calendar.service.CalendarService,
     #     'ONAFTER' -- delete events on and after the date given.
     deletion_choice = 'ALL'
     option_list = [('All events in this series', deletion_choice)]
+    # Maps the deletion instructions that delete some instances to the
+    # (start, end) range of instances they delete.
+    ranges = {}
     if start_date and end_date:
       deletion_choice = 'TWIXT'
       option_list.append(('Instances between %s and %s' %
                           (start_date, end_date), deletion_choice))
+      ranges['TWIXT'] = (start_date, end_date)
     elif start_date or end_date:
       delete_date = (start_date or end_date)
       option_list.append(('Instances on %s' % delete_date, 'ON'))
       option_list.append(('All events on and after %s' % delete_date,
                           'ONAFTER'))
       deletion_choice = 'ON'
+      ranges['ON'] = (delete_date, delete_date)
+      ranges['ONAFTER'] = (delete_date, None)
     option_list.append(('Do not delete', 'NONE'))
-    prompt_str = ''
-    for i, option in enumerate(option_list):
-      prompt_str += str(i) + ') ' + option[0] + '\n'
+    batch_url = USER_BATCH_URL_FORMAT % cal_user
     # Condense events so that the user isn't prompted for the same event
     # multiple times. This is assuming that recurring events have been expanded.
     events = googlecl.calendar.condense_recurring_events(events)
+    # Instances for every series are retrieved together, the first time a
+    # range is needed, rather than with one query per series.
+    instances_by_range = {}
+
+    def delete_instances_in_range(event, deletion_choice):
+      if deletion_choice not in instances_by_range:
+        range_start, range_end = ranges[deletion_choice]
+        instances_by_range[deletion_choice] = \
+            self._get_instances_by_series(events, cal_user,
+                                          range_start, range_end)
+      self._batch_delete_recur(event, batch_url,
+                               instances_by_range[deletion_choice])
+
+    # Maps each deletion instruction to the function that carries it out.
+    deletion_actions = {
+        'ALL': lambda event, _: self._delete_original_event(event, cal_user),
+        'NONE': lambda event, _: None}
+    for deletion_instruction in ranges:
+      deletion_actions[deletion_instruction] = delete_instances_in_range
+
+    if prompt:
+      # Show the options once, rather than again for every event.
+      for i, option in enumerate(option_list):
+        print '%i) %s' % (i, option[0])
+      valid_selections = [str(i) for i in range(len(option_list))]
     for event in events:
       if prompt:
-        delete_selection = -1
-        while delete_selection < 0 or delete_selection > len(option_list)-1:
-          msg = 'Delete "%s"?\n%s' %\
-                (safe_decode(event.title.text), prompt_str)
-          try:
-            delete_selection = int(raw_input(safe_encode(msg)))
-          except ValueError:
-            continue
-        deletion_choice = option_list[delete_selection][1]
+        msg = safe_encode('Delete "%s"? [0-%i]: ' %
+                          (safe_decode(event.title.text), len(option_list) - 1))
+        delete_selection = None
+        while delete_selection not in valid_selections:
+          delete_selection = raw_input(msg).strip()
+        deletion_choice = option_list[int(delete_selection)][1]
 
       # deletion_choice has either been picked by the prompt, or is the default
       # value. The default value is determined by the date info passed in,
       # and should be the "least destructive" option.
-      if deletion_choice == 'ALL':
-        self._delete_original_event(event, cal_user)
-      elif deletion_choice == 'TWIXT':
-        self._batch_delete_recur(event, cal_user,
-                                 start_date=start_date,
-                                 end_date=end_date)
-      elif deletion_choice == 'ON':
-        self._batch_delete_recur(event, cal_user,
-                                 start_date=delete_date,
-                                 end_date=delete_date)
-      elif deletion_choice == 'ONAFTER':
-        self._batch_delete_recur(event, cal_user,
-                                 start_date=delete_date)
-      elif deletion_choice != 'NONE':
+      try:
+        delete = deletion_actions[deletion_choice]
+      except KeyError:
         raise CalendarError('Got unexpected batch deletion command!')
+      delete(event, deletion_choice)
 
   DeleteRecurringEvents = delete_recurring_events
 
@@ -215,8 +383,10 @@ class CalendarServiceCL(gdata.calendar.service.CalendarService,
     _, recurring_events = self.get_events(cal_user,
                                           query=expanded_event.title.text,
                                           expand_recurrence=False)
+    series_id = expanded_event.original_event.id
     for event in recurring_events:
-      if event.id.text.split('/')[-1] == expanded_event.original_event.id:
+      # Only the last part of the id URL is the event's id.
+      if event.id.text.rsplit('/', 1)[-1] == series_id:
         LOG.debug('Matched on event %s, deleting without prompt' %
                   event.title.text)
         self.Delete(event.GetEditLink().href)
@@ -234,12 +404,9 @@ class CalendarServiceCL(gdata.calendar.service.CalendarService,
     Returns:
       Response entries from batch-inserting the events.
     """
-
-    import atom
     request_feed = gdata.calendar.CalendarEventFeed()
 #    start_text, _, end_text = googlecl.calendar.date.split_string(date, [','])
-    parser = DateRangeParser()
-    date_range = parser.parse(date)
+    date_range = googlecl.calendar.DATE_RANGE_PARSER.parse(date)
     start_time, end_time = date_range.to_when()
     for title in titles:
       event = gdata.calendar.CalendarEventEntry()
@@ -266,13 +433,15 @@ class CalendarServiceCL(gdata.calendar.service.CalendarService,
       The event that was added, or None if the event was not added.
 
     """
-    import atom
     request_feed = gdata.calendar.CalendarEventFeed()
+    # Elements are only read when the feed is serialized, so every event can
+    # share the same QuickAdd element.
+    quick_add = gdata.calendar.QuickAdd(value='true')
     for i, event_str in enumerate(quick_add_strings):
       event = gdata.calendar.CalendarEventEntry()
       event.content = atom.Content(text=event_str)
-      event.quick_add = gdata.calendar.QuickAdd(value='true')
-      request_feed.AddInsert(event, 'insert-' + event_str[0:5] + str(i))
+      event.quick_add = quick_add
+      request_feed.AddInsert(event, 'insert-%s%i' % (event_str[0:5], i))
     response_feed = self.ExecuteBatch(request_feed,
                                       USER_BATCH_URL_FORMAT % calendar_user)
     return response_feed.entry
@@ -291,26 +460,101 @@ class CalendarServiceCL(gdata.calendar.service.CalendarService,
     Keyword arguments:
       cal_name: Name of the calendar to match. Default None to return the
                 an instance representing only the default / main calendar.
+                If regular expressions are turned off, 'default', 'primary'
+                and the account's email address also refer to the main
+                calendar, without querying the server. (With regular
+                expressions on they may match other calendars too, so the
+                calendar list is always checked.)
 
     Returns:
       A list of Calendar instances, or None of there were no matches
       for cal_name.
 
     """
-    if not cal_name:
+    if not cal_name or (not self.use_regex and
+                        (cal_name in PRIMARY_CALENDAR_ALIASES or
+                         cal_name == self.email)):
       return [Calendar(user='default', name=self.email)]
-    else:
+    if cal_name in self._calendar_user_lists:
+      return self._calendar_user_lists[cal_name]
+    calendars = None
+    if self.cache_calendar_list:
+      calendars = self._read_cached_calendar_user_list(cal_name)
+    if calendars is None:
       cal_list = self.GetEntries('/calendar/feeds/default/allcalendars/full',
                                  cal_name,
                           converter=gdata.calendar.CalendarListFeedFromString)
       if cal_list:
-        return [Calendar(cal) for cal in cal_list]
-    return None
+        calendars = [Calendar(cal) for cal in cal_list]
+        if self.cache_calendar_list:
+          self._write_cached_calendar_user_list(cal_name, calendars)
+    self._calendar_user_lists[cal_name] = calendars
+    return calendars
 
   GetCalendarUserList = get_calendar_user_list
 
+  def _get_calendar_list_cache_path(self):
+    """Return the path to the calendar list cache for this account."""
+    return googlecl.get_data_path(CALENDAR_LIST_CACHE_FILENAME_FORMAT %
+                                  self.email,
+                                  create_missing_dir=True)
+
+  def _load_calendar_list_cache(self):
+    """Load the calendar list cache from disk.
+
+    Returns:
+      Dictionary mapping (calendar name, regex) pairs to tuples of
+      (timestamp, calendars), where calendars is a list of (user, name)
+      tuples. Empty if there is no cache or it could not be read.
+    """
+    cache_path = self._get_calendar_list_cache_path()
+    if not os.path.exists(cache_path):
+      return {}
+    try:
+      with open(cache_path, 'rb') as cache_file:
+        return pickle.load(cache_file)
+    except (EnvironmentError, EOFError, ValueError,
+            pickle.UnpicklingError), err:
+      LOG.debug('Could not read calendar list cache: ' + str(err))
+      return {}
+
+  def _calendar_list_cache_key(self, cal_name):
+    """Return the calendar list cache key for cal_name.
+
+    The same name matches different calendars depending on whether it is
+    treated as a regular expression, so results are cached per mode.
+    """
+    return (cal_name, self.use_regex)
+
+  def _read_cached_calendar_user_list(self, cal_name):
+    """Return cached Calendar instances for cal_name, or None if not cached."""
+    try:
+      timestamp, calendars = self._load_calendar_list_cache()[
+          self._calendar_list_cache_key(cal_name)]
+    except KeyError:
+      return None
+    if time.time() - timestamp >= CALENDAR_LIST_CACHE_TTL:
+      return None
+    LOG.debug('Using cached calendar list for ' + safe_encode(cal_name))
+    return [Calendar(user=user, name=name) for user, name in calendars]
+
+  def _write_cached_calendar_user_list(self, cal_name, calendars):
+    """Store Calendar instances for cal_name in the calendar list cache."""
+    now = time.time()
+    cache = dict((name, value)
+                 for name, value in self._load_calendar_list_cache().items()
+                 if now - value[0] < CALENDAR_LIST_CACHE_TTL)
+    cache[self._calendar_list_cache_key(cal_name)] = (
+        now, [(cal.user, cal.name) for cal in calendars])
+    try:
+      with open(self._get_calendar_list_cache_path(), 'wb') as cache_file:
+        pickle.dump(cache, cache_file)
+    except EnvironmentError, err:
+      LOG.debug('Could not write calendar list cache: ' + str(err))
+
   def get_events(self, calendar_user, start_date=None, end_date=None,
-                 titles=None, query=None, expand_recurrence=True, split=True):
+                 titles=None, query=None, expand_recurrence=True, split=True,
+                 max_results=None):
     """Get events.
 
     Keyword arguments:
@@ -319,18 +563,77 @@ class CalendarServiceCL(gdata.calendar.service.CalendarService,
       start_date: Start date of the event(s). Default None.
       end_date: End date of the event(s). Default None.
       titles: string or list Title(s) to look for in the event, supporting
-              regular expressions. Default None for any title.
+              regular expressions. Default None for any title. If regular
+              expressions are turned off and there is a single title, the
+              title is also sent to the server as a full-text search phrase,
+              so fewer events have to be downloaded. Titles containing
+              double quotes are not sent, since they would break the phrase.
       query: Query string (not encoded) for doing full-text searches on event
              titles and content.
       expand_recurrence: If true, expand recurring events per the 'singleevents'
                          query parameter. Otherwise, don't.
       split: Split events into "one-time" and "recurring" events.
+      max_results: Number of events to request per page of results. Default
+                   None to use the max_results config option. Further pages
+                   are still retrieved unless cap_results is set.
 
     Returns:
       List of events from calendar that match the given params.
     """
-    query = gdata.calendar.service.CalendarEventQuery(user=calendar_user,
-                                                      text_query=query)
+    events = list(self.iter_events(calendar_user, start_date=start_date,
+                                   end_date=end_date, titles=titles,
+                                   query=query,
+                                   expand_recurrence=expand_recurrence,
+                                   max_results=max_results))
+    if split:
+      return googlecl.calendar.partition_recurring_events(events,
+                                                          expand_recurrence)
+    else:
+      return events
+
+  GetEvents = get_events
+
+  def iter_events(self, calendar_user, start_date=None, end_date=None,
+                  titles=None, query=None, expand_recurrence=True,
+                  max_results=None):
+    """Iterate over events.
+
+    Events are yielded as soon as the page of results holding them has been
+    retrieved, so callers can start on them before the whole feed is
+    downloaded.
+
+    Keyword arguments:
+      See get_events. Events are not split into one-time and recurring events.
+
+    Returns:
+      Iterator over events from calendar that match the given params.
+    """
+    text_query = query
+    if not self.use_regex and not hasattr(titles, 'match'):
+      if isinstance(titles, basestring):
+        title_list = [titles]
+      else:
+        title_list = [title for title in titles or [] if title]
+      # Full-text search terms are ANDed together, so only a single title can
+      # be pushed to the server. Titles are still matched exactly by
+      # IterEntries, since full-text search also looks at event content.
+      # Quotes can't be escaped inside a phrase, so titles with quotes are
+      # only matched locally.
+      if len(title_list) == 1 and '"' not in title_list[0]:
+        title_phrase = u'"%s"' % safe_decode(title_list[0])
+        if text_query:
+          text_query = safe_decode(text_query) + u' ' + title_phrase
+        else:
+          text_query = title_phrase
+    if text_query:
+      # The query parameters are escaped with urllib, which chokes on
+      # non-ascii unicode.
+      text_query = safe_encode(text_query, 'utf-8')
+    # The template is only copied shallowly, so only set options here,
+    # never modify ones already on it in place (like categories).
+    query = copy.copy(self._get_event_query_template(calendar_user))
+    if text_query:
+      query.text_query = text_query
     if start_date:
       query.start_min = start_date.to_query()
     if end_date:
@@ -338,38 +641,37 @@ class CalendarServiceCL(gdata.calendar.service.CalendarService,
       query.start_max = end_date.to_inclusive_query()
     if expand_recurrence:
       query.singleevents = 'true'
-    query.orderby = 'starttime'
-    query.sortorder = 'ascend'
-    events = self.GetEntries(query.ToUri(), titles,
+    if max_results:
+      query.max_results = str(max_results)
+    events = self.IterEntries(query.ToUri(), titles,
                            converter=gdata.calendar.CalendarEventFeedFromString)
 
-    if split:
-      single_events = googlecl.calendar.filter_recurring_events(events,
-                                                              expand_recurrence)
-      recurring_events = googlecl.calendar.filter_single_events(events,
-                                                              expand_recurrence)
-      if start_date or end_date:
-        # Because of how the "when" info on all-day events is stored, we need to
-        # do a filter step to remove all-day events on the edge of the date
-        # range.
-        single_events = \
-            googlecl.calendar.filter_all_day_events_outside_range(start_date,
-                                                                  end_date,
-                                                                  single_events)
-        recurring_events = \
-            googlecl.calendar.filter_all_day_events_outside_range(start_date,
-                                                                  end_date,
-                                                               recurring_events)
-      return single_events, recurring_events
-    else:
-      if start_date or end_date:
-        return googlecl.calendar.filter_all_day_events_outside_range(start_date,
-                                                                     end_date,
-                                                                     events)
-      else:
-        return events
+    if start_date or end_date:
+      # Because of how the "when" info on all-day events is stored, we need to
+      # do a filter step to remove all-day events on the edge of the date
+      # range.
+      events = googlecl.calendar.ifilter_all_day_events_outside_range(
+          start_date, end_date, events)
+    return events
 
-  GetEvents = get_events
+  IterEvents = iter_events
+
+  def _get_event_query_template(self, calendar_user):
+    """Return an event query with the options every events query uses.
+
+    Copy the returned query before changing it.
+
+    Args:
+      calendar_user: "User" of the calendar the query is for.
+    """
+    try:
+      return self._event_query_templates[calendar_user]
+    except KeyError:
+      template = gdata.calendar.service.CalendarEventQuery(user=calendar_user)
+      template.orderby = 'starttime'
+      template.sortorder = 'ascend'
+      self._event_query_templates[calendar_user] = template
+      return template
 
   def is_token_valid(self, test_uri='/calendar/feeds/default/private/full'):
     """Check that the token being used is valid."""
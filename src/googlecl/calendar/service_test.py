@@ -0,0 +1,67 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the calendar service."""
+
+import ConfigParser
+import os
+import service
+import shutil
+import tempfile
+import unittest
+from googlecl.calendar import SECTION_HEADER
+from googlecl.config import parser
+
+
+def make_client(use_regex):
+  config = parser.ConfigParser(ConfigParser.ConfigParser)
+  config.set_missing_default(SECTION_HEADER, 'regex', use_regex)
+  client = service.CalendarServiceCL(config)
+  client.email = 'me@example.com'
+  return client
+
+
+class CalendarListCache(unittest.TestCase):
+
+  def setUp(self):
+    self.data_home = tempfile.mkdtemp()
+    self.old_data_home = os.environ.get('XDG_DATA_HOME')
+    os.environ['XDG_DATA_HOME'] = self.data_home
+    self.calendars = [service.Calendar(user='work%40group', name='work')]
+
+  def tearDown(self):
+    if self.old_data_home is None:
+      del os.environ['XDG_DATA_HOME']
+    else:
+      os.environ['XDG_DATA_HOME'] = self.old_data_home
+    shutil.rmtree(self.data_home)
+
+  def testCachedInSameMode(self):
+    make_client(True)._write_cached_calendar_user_list('work',
+                                                       self.calendars)
+    cached = make_client(True)._read_cached_calendar_user_list('work')
+    self.assertEqual([(cal.user, cal.name) for cal in cached],
+                     [('work%40group', 'work')])
+
+  def testNotSharedBetweenRegexModes(self):
+    make_client(True)._write_cached_calendar_user_list('work',
+                                                       self.calendars)
+    self.assertEqual(
+        make_client(False)._read_cached_calendar_user_list('work'), None)
+
+
+if __name__ == '__main__':
+  unittest.main()
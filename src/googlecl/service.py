@@ -17,12 +17,105 @@
   the command line."""
 
 
+import atom.http
 import gdata.service
 import googlecl
 import googlecl.base
+import httplib
 import logging
+import os
+import select
+import socket
+import threading
 
 LOG = logging.getLogger(__name__)
+# Methods that can safely be repeated if the connection fails mid-request.
+IDEMPOTENT_METHODS = ('GET', 'HEAD', 'PUT', 'DELETE')
+
+
+def _connection_dropped(connection):
+  """Check if the other end has closed an idle connection.
+
+  An idle HTTP connection has nothing to read, so if its socket is readable the
+  server has either closed it or sent something we can't make sense of.
+
+  """
+  if connection.sock is None:
+    return False
+  try:
+    readable, _, _ = select.select([connection.sock], [], [], 0)
+  except (select.error, socket.error, ValueError):
+    return True
+  return bool(readable)
+
+
+class KeepAliveHttpClient(atom.http.ProxiedHttpClient):
+
+  """HTTP client that reuses one connection per host across requests.
+
+  The stock atom client opens a fresh connection (and, for https, does a fresh
+  SSL handshake) for every request. Keeping the connection around lets a run
+  of requests against the same host share a single socket. httplib connections
+  can't be shared between threads, so each thread keeps its own.
+
+  """
+
+  def __init__(self, headers=None):
+    atom.http.ProxiedHttpClient.__init__(self, headers)
+    self._local = threading.local()
+
+  def _get_connections(self):
+    """Return the connections cached by the current thread."""
+    try:
+      return self._local.connections
+    except AttributeError:
+      self._local.connections = {}
+      return self._local.connections
+
+  def _prepare_connection(self, url, headers):
+    # Proxied connections are tunnelled by hand, and httplib can't re-open the
+    # tunnel on its own if it closes. Let the parent build those every time.
+    if (os.environ.get(url.protocol + '_proxy') or
+        os.environ.get(url.protocol.upper() + '_PROXY')):
+      self._local.reused_connection = False
+      return atom.http.ProxiedHttpClient._prepare_connection(self, url,
+                                                             headers)
+    connections = self._get_connections()
+    key = (url.protocol, url.host, url.port)
+    connection = connections.get(key)
+    if connection is not None and _connection_dropped(connection):
+      LOG.debug('Server closed idle connection to %s, reconnecting' % url.host)
+      connection.close()
+      connection = None
+    self._local.reused_connection = connection is not None
+    if connection is None:
+      connection = atom.http.ProxiedHttpClient._prepare_connection(self, url,
+                                                                   headers)
+      connections[key] = connection
+    return connection
+
+  def close(self):
+    """Close and forget every connection cached by the current thread."""
+    connections = self._get_connections()
+    for connection in connections.values():
+      connection.close()
+    connections.clear()
+
+  def request(self, operation, url, data=None, headers=None):
+    try:
+      return atom.http.ProxiedHttpClient.request(self, operation, url, data,
+                                                 headers)
+    except (httplib.HTTPException, socket.error), err:
+      # The server is free to drop an idle keep-alive connection. If that's
+      # what happened, try once more on a fresh connection. The request may
+      # have reached the server anyway, so only repeat it if that's harmless.
+      if (not getattr(self._local, 'reused_connection', False) or
+          operation.upper() not in IDEMPOTENT_METHODS):
+        raise
+      LOG.debug('Reused connection failed (%s), reconnecting' % err)
+      self.close()
+      return atom.http.ProxiedHttpClient.request(self, operation, url, data,
+                                                 headers)
 
 
 class BaseServiceCL(googlecl.base.BaseCL):
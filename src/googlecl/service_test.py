@@ -0,0 +1,91 @@
+#!/usr/bin/python
+#
+# Copyright (C) 2010 Google Inc.
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#      http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+# WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+# See the License for the specific language governing permissions and
+# limitations under the License.
+
+"""Tests for the keep-alive HTTP client."""
+
+import socket
+import threading
+import unittest
+
+from googlecl.service import KeepAliveHttpClient
+
+
+class OneRequestPerConnectionServer(threading.Thread):
+
+  """Answers one request on each connection, then closes it.
+
+  This is what a server dropping an idle keep-alive connection looks like.
+
+  """
+
+  def __init__(self):
+    threading.Thread.__init__(self)
+    self.daemon = True
+    self.listener = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    self.listener.bind(('127.0.0.1', 0))
+    self.listener.listen(5)
+    self.port = self.listener.getsockname()[1]
+    self.methods = []
+    self.connection_closed = threading.Event()
+
+  def run(self):
+    while True:
+      try:
+        conn, _ = self.listener.accept()
+      except socket.error:
+        return
+      request = ''
+      while '\r\n\r\n' not in request:
+        chunk = conn.recv(4096)
+        if not chunk:
+          break
+        request += chunk
+      if request:
+        self.methods.append(request.split(' ', 1)[0])
+        conn.sendall('HTTP/1.1 200 OK\r\nContent-Length: 2\r\n\r\nok')
+      conn.close()
+      self.connection_closed.set()
+
+  def stop(self):
+    self.listener.close()
+
+
+class KeepAliveHttpClientTest(unittest.TestCase):
+
+  def setUp(self):
+    self.server = OneRequestPerConnectionServer()
+    self.server.start()
+    self.url = 'http://127.0.0.1:%d/feed' % self.server.port
+    self.client = KeepAliveHttpClient()
+
+  def tearDown(self):
+    self.client.close()
+    self.server.stop()
+
+  def testPostAfterServerDroppedConnection(self):
+    response = self.client.request('GET', self.url)
+    self.assertEqual(response.read(), 'ok')
+    self.assertTrue(self.server.connection_closed.wait(5))
+    # POSTs are never retried, so this only works if the dropped connection
+    # is noticed before the request goes out.
+    response = self.client.request('POST', self.url, data='<feed/>')
+    self.assertEqual(response.status, 200)
+    self.assertEqual(response.read(), 'ok')
+    self.assertEqual(self.server.methods, ['GET', 'POST'])
+
+
+if __name__ == '__main__':
+  unittest.main()